@@ -1,12 +1,19 @@
-from typing import List
+from functools import lru_cache
+from typing import Tuple
+
+
+@lru_cache(maxsize=1024)
+def _questions_for(topic: str) -> Tuple[str, ...]:
+    return (
+        f"What is the time complexity of the optimal solution for {topic}?",
+        f"Can you describe edge cases for {topic}?",
+        f"How would you test your solution for {topic}?",
+    )
 
 
 class InterviewAgent:
     """Simulates interviewer follow-ups for a given topic."""
 
-    def generate_questions(self, topic: str) -> List[str]:
-        return [
-            f"What is the time complexity of the optimal solution for {topic}?",
-            f"Can you describe edge cases for {topic}?",
-            f"How would you test your solution for {topic}?",
-        ]
+    def generate_questions(self, topic: str) -> Tuple[str, ...]:
+        # Cached per topic; a tuple so callers cannot mutate the shared result
+        return _questions_for(topic)
@@ -1,13 +1,20 @@
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Tuple
+
+
+@lru_cache(maxsize=3)
+def _plan_for(level: str) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    core = ("Arrays", "Linked Lists", "Stacks & Queues", "Hashing", "Sorting", "Two Pointers")
+    if level == "intermediate":
+        core += ("Binary Search", "Trees", "Heaps", "Graphs Basics")
+    if level == "advanced":
+        core += ("DP", "Advanced Graphs", "Tries", "Greedy vs DP")
+    return (("week1", core[:4]), ("week2", core[4:8]), ("week3", core[8:12]), ("week4", core[12:16]))
 
 
 class LearningPlanAgent:
     """Generates a weekly DSA study plan based on user progress."""
 
-    def weekly_plan(self, level: str = "beginner") -> Dict[str, List[str]]:
-        core = ["Arrays", "Linked Lists", "Stacks & Queues", "Hashing", "Sorting", "Two Pointers"]
-        if level == "intermediate":
-            core += ["Binary Search", "Trees", "Heaps", "Graphs Basics"]
-        if level == "advanced":
-            core += ["DP", "Advanced Graphs", "Tries", "Greedy vs DP"]
-        return {"week1": core[:4], "week2": core[4:8], "week3": core[8:12], "week4": core[12:16]}
+    def weekly_plan(self, level: str = "beginner") -> Dict[str, Tuple[str, ...]]:
+        # Weeks are cached immutable tuples; only the small outer dict is built per call
+        return dict(_plan_for(level))
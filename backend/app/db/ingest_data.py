@@ -1,61 +1,334 @@
 import os
-import glob
-import uuid
+import io
+import sys
+import json
+import mmap
+import hashlib
 import time
-from typing import List
+import queue
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
 
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:  # pragma: no cover
-    SentenceTransformer = None  # type: ignore
+# Allow running as a script (python backend/app/db/ingest_data.py) while importing app.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from app.services.cache import DEFAULT_EMBEDDING_CACHE_PATH, EmbeddingCache  # noqa: E402
+from app.services.clients import collection_params, get_openai, get_qdrant  # noqa: E402
+from app.services.embedders import (  # noqa: E402
+    encode_length_sorted,
+    load_local_embedder,
+    local_embedder_id,
+    normalize_rows,
+)
 
 load_dotenv()
 
 COLLECTION_NAME = "dsa_docs"
-EMBED_DIM_OPENAI = 1536
+# text-embedding-3-small is Matryoshka-trained: truncating 1536 -> 512 dims keeps most of
+# the retrieval quality at a third of the bytes stored and moved
+EMBED_DIM_OPENAI = int(os.getenv("OPENAI_EMBED_DIM", "512"))
 LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local").lower()
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+# OpenAI Batch API caps a single job at 50k requests
+OPENAI_BATCH_MAX_REQUESTS = 50_000
+# Qdrant's default; indexing is switched off (0) during bulk upload and restored afterwards
+INDEXING_THRESHOLD = 20000
+
+
+def _walk(data_dir: str) -> Iterator[str]:
+    if not os.path.isdir(data_dir):
+        return
+    stack = [data_dir]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.endswith((".md", ".txt")):
+                    yield entry.path
+
+
+def _read_doc(p: str, data_dir: str) -> dict:
+    source = os.path.relpath(p, data_dir)
+    with open(p, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap cannot map an empty file
+            return {"text": "", "source": source}
+        # Decode straight from the page-cache mapping instead of an intermediate bytes copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return {"text": str(mm, "utf-8", "ignore"), "source": source}
 
 
 def read_texts(data_dir: str) -> List[dict]:
-    paths = glob.glob(os.path.join(data_dir, "**", "*"), recursive=True)
-    texts = []
-    for p in paths:
-        if os.path.isdir(p):
-            continue
-        if any(p.endswith(ext) for ext in [".md", ".txt"]):
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                texts.append({"text": f.read(), "source": os.path.relpath(p, data_dir)})
-    return texts
+    # File reads release the GIL, so a thread pool overlaps per-file I/O latency
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        return list(pool.map(lambda p: _read_doc(p, data_dir), _walk(data_dir)))
+
+
+def iter_texts(data_dir: str) -> Iterator[dict]:
+    # Lazy variant of read_texts: only the current document is held in memory
+    for p in _walk(data_dir):
+        yield _read_doc(p, data_dir)
 
 
 def chunk_text(text: str, size: int = 500, overlap: int = 50) -> List[str]:
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(len(text), start + size)
-        chunks.append(text[start:end])
-        start = end - overlap
-        if start < 0:
-            start = 0
-    return chunks
+    step = size - overlap
+    if step <= 0:
+        raise ValueError("chunk overlap must be smaller than chunk size")
+    # Window starts are computed up front; each chunk is a single slice. Stopping at
+    # len - overlap avoids a trailing window that only repeats the previous overlap.
+    return [text[s:s + size] for s in range(0, max(len(text) - overlap, 1), step)] if text else []
+
+
+def embed_with_batch_api(texts: List[str]) -> List[List[float]]:
+    """Embed texts through the OpenAI Batch API (async job, ~50% cheaper than sync calls)."""
+    openai_client = get_openai()
+    poll_s = int(os.getenv("INGEST_BATCH_POLL_S", "30"))
+    vectors: List[List[float]] = []
+    for offset in range(0, len(texts), OPENAI_BATCH_MAX_REQUESTS):
+        job_texts = texts[offset:offset + OPENAI_BATCH_MAX_REQUESTS]
+        # Positions are unique within the job, so no random IDs are needed
+        custom_ids = [f"chunk-{offset + i}" for i in range(len(job_texts))]
+        buf = io.StringIO()
+        for custom_id, text in zip(custom_ids, job_texts):
+            buf.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/embeddings",
+                "body": {"model": OPENAI_EMBED_MODEL, "input": text, "dimensions": EMBED_DIM_OPENAI},
+            }) + "\n")
+        input_file = openai_client.files.create(
+            file=("embedding_requests.jsonl", buf.getvalue().encode("utf-8")),
+            purpose="batch",
+        )
+        batch = openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/embeddings",
+            completion_window="24h",
+        )
+        print(f"Submitted batch {batch.id} with {len(job_texts)} chunks")
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_s)
+            batch = openai_client.batches.retrieve(batch.id)
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+        by_id: Dict[str, List[float]] = {}
+        for line in openai_client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                raise RuntimeError(f"Embedding request {result.get('custom_id')} failed: {result.get('error')}")
+            by_id[result["custom_id"]] = response["body"]["data"][0]["embedding"]
+        missing = [cid for cid in custom_ids if cid not in by_id]
+        if missing:
+            raise RuntimeError(f"Batch {batch.id} returned no embedding for {len(missing)} chunks")
+        vectors.extend(normalize_rows([by_id[cid] for cid in custom_ids]).tolist())
+    return vectors
+
+
+def point_id(payload: dict) -> int:
+    # Content-derived ID: re-ingesting the same chunk overwrites its point instead of
+    # appending a copy, and deleted points can never be collided with
+    h = hashlib.blake2b(f"{payload['source']}\0{payload['text']}".encode("utf-8"), digest_size=8)
+    return int.from_bytes(h.digest(), "big")
+
+
+def iter_payloads(docs: Iterable[dict]) -> Iterator[dict]:
+    # Overlapping windows over repeated boilerplate produce byte-identical chunks;
+    # embedding them again adds cost but no retrieval value
+    seen: Set[bytes] = set()
+    for doc in docs:
+        for chunk in chunk_text(doc["text"]):
+            h = hashlib.blake2b(chunk.encode("utf-8"), digest_size=8).digest()
+            if h in seen:
+                continue
+            seen.add(h)
+            yield {"text": chunk, "source": doc["source"]}
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    # Blocking put that gives up once another pipeline stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return None
+
+
+def ingest_docs(
+    client: QdrantClient,
+    data_dir: str,
+    embedding_cache: Optional[EmbeddingCache],
+    local_embedder,
+) -> int:
+    BATCH = int(os.getenv("INGEST_BATCH", "64"))
+    MAX_CHUNKS = int(os.getenv("INGEST_MAX_CHUNKS", "0"))  # 0 = no cap
+    SLEEP_MS = int(os.getenv("INGEST_SLEEP_MS", "100"))
+    UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", "256"))
+    if EMBEDDING_PROVIDER == "openai":
+        docs = read_texts(data_dir)
+        if not docs:
+            print("No data found to ingest.")
+            return 0
+        # Bulk ingestion is latency-tolerant: submit every chunk as one Batch API job
+        # instead of paying a synchronous round-trip (and 429 backoff) per batch.
+        payloads = list(iter_payloads(docs))
+        if MAX_CHUNKS:
+            payloads = payloads[:MAX_CHUNKS]
+        if not payloads:
+            print("No chunks to ingest.")
+            return 0
+        texts = [p["text"] for p in payloads]
+        if embedding_cache is not None:
+            vecs = embedding_cache.embed(texts, embed_with_batch_api)
+        else:
+            vecs = embed_with_batch_api(texts)
+        ids = [point_id(p) for p in payloads]
+        # Split the upsert so a large corpus does not exceed the request size limit; only
+        # the last request waits, which confirms every earlier write was applied
+        for i in range(0, len(payloads), UPSERT_BATCH):
+            client.upsert(
+                collection_name=COLLECTION_NAME,
+                points=qmodels.Batch(
+                    ids=ids[i:i + UPSERT_BATCH],
+                    vectors=vecs[i:i + UPSERT_BATCH],
+                    payloads=payloads[i:i + UPSERT_BATCH],
+                ),
+                wait=i + UPSERT_BATCH >= len(payloads),
+            )
+        print(f"Ingested {len(payloads)} chunks into '{COLLECTION_NAME}'.")
+        return len(payloads)
+
+    def encode_local(texts: List[str]) -> List[List[float]]:
+        # Local embeddings by default to avoid 429 and reduce latency
+        return encode_length_sorted(local_embedder, texts).tolist()
+
+    # Three-stage pipeline (read+chunk -> embed -> upsert) over bounded queues, so disk
+    # I/O and Qdrant writes overlap with encoding and peak memory stays at a few batches
+    # regardless of corpus size. None is the end-of-stream sentinel.
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    q_batches: queue.Queue = queue.Queue(maxsize=4)
+    q_upserts: queue.Queue = queue.Queue(maxsize=4)
+    total = [0]
+
+    def produce() -> None:
+        try:
+            payloads = iter_payloads(iter_texts(data_dir))
+            batch: List[dict] = []
+            for payload in itertools.islice(payloads, MAX_CHUNKS or None):
+                batch.append(payload)
+                if len(batch) >= BATCH:
+                    if not _put(q_batches, batch, stop):
+                        return
+                    batch = []
+            if batch:
+                _put(q_batches, batch, stop)
+            _put(q_batches, None, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def upsert() -> None:
+        def send(item: tuple, wait: bool) -> None:
+            payloads_batch, vecs = item
+            client.upsert(
+                collection_name=COLLECTION_NAME,
+                points=qmodels.Batch(
+                    ids=[point_id(p) for p in payloads_batch],
+                    vectors=vecs,
+                    payloads=payloads_batch,
+                ),
+                wait=wait,
+            )
+            total[0] += len(payloads_batch)
+
+        try:
+            # Hold one batch back so the final write can wait=True as a durability barrier
+            pending = None
+            while True:
+                item = _get(q_upserts, stop)
+                if item is None:
+                    break
+                if pending is not None:
+                    send(pending, wait=False)
+                pending = item
+            if pending is not None and not stop.is_set():
+                send(pending, wait=True)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    upserter = threading.Thread(target=upsert, name="ingest-upserter", daemon=True)
+    producer.start()
+    upserter.start()
+    try:
+        while True:
+            batch = _get(q_batches, stop)
+            if batch is None:
+                break
+            texts = [p["text"] for p in batch]
+            if embedding_cache is not None:
+                vecs = embedding_cache.embed(texts, encode_local)
+            else:
+                vecs = encode_local(texts)
+            if not _put(q_upserts, (batch, vecs), stop):
+                break
+            if SLEEP_MS > 0:
+                time.sleep(SLEEP_MS / 1000.0)
+        _put(q_upserts, None, stop)
+        upserter.join()
+    finally:
+        stop.set()
+    producer.join()
+    if errors:
+        raise errors[0]
+
+    if MAX_CHUNKS and total[0] >= MAX_CHUNKS:
+        print(f"Stopping early at {total[0]} chunks (MAX_CHUNKS)")
+    if not total[0]:
+        print("No data found to ingest.")
+    else:
+        print(f"Ingested {total[0]} chunks into '{COLLECTION_NAME}'.")
+    return total[0]
 
 
 def main() -> None:
-    # backend/app/db -> repo_root/data (go up 3 to backend, 1 more to repo root)
-    data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../data"))
-    qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-    client = QdrantClient(url=qdrant_url)
+    # backend/app/db -> repo_root/data (up 2 to backend, 1 more to repo root), unless DATA_DIR is set
+    data_dir = os.path.abspath(os.getenv("DATA_DIR") or os.path.join(os.path.dirname(__file__), "../../../data"))
+    # gRPC sends vectors as packed protobuf floats instead of JSON text
+    client = get_qdrant()
     # Prepare embedder
     local_embedder = None
     if EMBEDDING_PROVIDER == "local":
-        if SentenceTransformer is None:
-            raise RuntimeError("sentence-transformers not available. Install it or set EMBEDDING_PROVIDER=openai")
-        local_embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
+        local_embedder = load_local_embedder(LOCAL_EMBED_MODEL)
+
+    cache_path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH)
+    if EMBEDDING_PROVIDER == "openai":
+        cache_model = f"{OPENAI_EMBED_MODEL}@{EMBED_DIM_OPENAI}"
+    else:
+        cache_model = local_embedder_id(LOCAL_EMBED_MODEL)
+    embedding_cache = EmbeddingCache(cache_model, cache_path) if cache_path else None
 
     # Ensure collection (no drop/recreate to avoid churn)
     try:
@@ -65,59 +338,26 @@ def main() -> None:
 
     if not exists:
         size = EMBED_DIM_OPENAI if EMBEDDING_PROVIDER == "openai" else 384
+        # Vectors are normalized before upload (local encoder, embed_with_batch_api)
         client.create_collection(
             collection_name=COLLECTION_NAME,
-            vectors_config=qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE),
+            **collection_params(size),
+            optimizers_config=qmodels.OptimizersConfigDiff(indexing_threshold=0),
         )
-
-    docs = read_texts(data_dir)
-    if not docs:
-        print("No data found to ingest.")
-        return
-
-    # Stream embeddings and upserts per batch to keep memory low
-    BATCH = int(os.getenv("INGEST_BATCH", "1"))
-    MAX_CHUNKS = int(os.getenv("INGEST_MAX_CHUNKS", "0"))  # 0 = no cap
-    SLEEP_MS = int(os.getenv("INGEST_SLEEP_MS", "100"))
-    total_chunks = 0
-    batch_payloads: List[dict] = []
-
-    def flush_batch(payloads_batch: List[dict]) -> int:
-        if not payloads_batch:
-            return 0
-        texts = [p["text"] for p in payloads_batch]
-        # Embeddings: local by default to avoid 429 and reduce latency
-        if EMBEDDING_PROVIDER == "openai":
-            from openai import OpenAI  # local import to avoid importing if unused
-            openai_client = OpenAI()
-            emb = openai_client.embeddings.create(model="text-embedding-3-small", input=texts)
-            vecs = [d.embedding for d in emb.data]
-        else:
-            embs = local_embedder.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
-            vecs = [e.tolist() for e in embs]
-        ids = [str(uuid.uuid4()) for _ in payloads_batch]
-        client.upsert(
+    else:
+        # Defer HNSW indexing until the bulk upload has finished
+        client.update_collection(
             collection_name=COLLECTION_NAME,
-            points=qmodels.Batch(ids=ids, vectors=vecs, payloads=payloads_batch),
+            optimizers_config=qmodels.OptimizersConfigDiff(indexing_threshold=0),
         )
-        return len(payloads_batch)
 
-    for doc in docs:
-        for chunk in chunk_text(doc["text"]):
-            batch_payloads.append({"text": chunk, "source": doc["source"]})
-            if len(batch_payloads) >= BATCH:
-                total_chunks += flush_batch(batch_payloads)
-                batch_payloads = []
-                if SLEEP_MS > 0:
-                    time.sleep(SLEEP_MS / 1000.0)
-                if MAX_CHUNKS and total_chunks >= MAX_CHUNKS:
-                    print(f"Stopping early at {total_chunks} chunks (MAX_CHUNKS)")
-                    print(f"Ingested {total_chunks} chunks into '{COLLECTION_NAME}'.")
-                    return
-
-    # Flush remaining
-    total_chunks += flush_batch(batch_payloads)
-    print(f"Ingested {total_chunks} chunks into '{COLLECTION_NAME}'.")
+    try:
+        ingest_docs(client, data_dir, embedding_cache, local_embedder)
+    finally:
+        client.update_collection(
+            collection_name=COLLECTION_NAME,
+            optimizers_config=qmodels.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD),
+        )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
 import os
-import time
+import asyncio
 from typing import Any, Dict
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -33,6 +34,16 @@ except Exception:
 
 rag_service = RagService()
 
+
+@app.on_event("startup")
+async def warm_up() -> None:
+    # Loads the local embedder, opens the Qdrant channel and creates the collection
+    # before the first /ask
+    try:
+        await rag_service.warm_up()
+    except Exception:
+        pass
+
 # Testing Sentry 
 
 @app.api_route("/sentry-debug", methods=["GET", "POST"])
@@ -46,12 +57,22 @@ class AskRequest(BaseModel):
 
 
 @app.post("/ask")
-def ask(req: AskRequest) -> Dict[str, Any]:
-    start = time.time()
+async def ask(req: AskRequest) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
     try:
         # Enforce single super-user
-        result = rag_service.answer_question(user_id="Charan", question=req.question)
-        result["latency_ms"] = int((time.time() - start) * 1000)
+        result = await rag_service.answer_question(user_id="Charan", question=req.question)
+        result["latency_ms"] = int((loop.time() - start) * 1000)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest) -> StreamingResponse:
+    # Same as /ask, but streams server-sent events so the first tokens show up immediately
+    return StreamingResponse(
+        rag_service.stream_answer(user_id="Charan", question=req.question),
+        media_type="text/event-stream",
+    )
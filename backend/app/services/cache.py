@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dsa-sensei", "embeddings.sqlite3")
+DEFAULT_ANSWER_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dsa-sensei", "answers.sqlite3")
+# Stay well under SQLite's bound-parameter limit for IN (...) lookups
+_SQLITE_MAX_PARAMS = 500
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # With WAL, NORMAL only fsyncs at checkpoints and still cannot corrupt the database
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _normalize(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+class SemanticCache:
+    """Serves answers for near-duplicate queries by cosine similarity against recent query vectors."""
+
+    def __init__(self, dim: int, capacity: int = 512, threshold: float = 0.97) -> None:
+        self.capacity = capacity
+        self.threshold = threshold
+        # Rows are stored L2-normalized so cosine similarity is a plain dot product
+        self._vecs = np.empty((capacity, dim), dtype=np.float32)
+        self._entries: List[Dict[str, Any]] = []
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def get(self, vec: Sequence[float]) -> Optional[Dict[str, Any]]:
+        q = _normalize(vec)
+        with self._lock:
+            n = len(self._entries)
+            if n == 0:
+                return None
+            sims = self._vecs[:n] @ q
+            i = int(np.argmax(sims))
+            if sims[i] < self.threshold:
+                return None
+            self._tick += 1
+            self._last_used[i] = self._tick
+            return self._entries[i]
+
+    def put(self, vec: Sequence[float], entry: Dict[str, Any]) -> None:
+        if self.capacity <= 0:
+            return
+        q = _normalize(vec)
+        with self._lock:
+            n = len(self._entries)
+            if n < self.capacity:
+                i = n
+                self._entries.append(entry)
+            else:
+                # Evict the least recently used row
+                i = int(np.argmin(self._last_used))
+                self._entries[i] = entry
+            self._vecs[i] = q
+            self._tick += 1
+            self._last_used[i] = self._tick
+
+
+class SimHashCache:
+    """LRU cache keyed by a 64-bit random-hyperplane (SimHash) signature of a vector.
+
+    Vectors whose signatures match exactly are near-duplicates, so their results can
+    be shared without a round-trip to the vector store.
+    """
+
+    def __init__(self, dim: int, capacity: int = 4096, bits: int = 64, seed: int = 0) -> None:
+        self.capacity = capacity
+        self._planes = np.random.default_rng(seed).standard_normal((bits, dim)).astype(np.float32)
+        self._data: "OrderedDict[Tuple[Hashable, bytes], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def signature(self, vec: Sequence[float]) -> bytes:
+        return np.packbits(self._planes @ np.asarray(vec, dtype=np.float32) > 0).tobytes()
+
+    def get(self, key: Tuple[Hashable, bytes]) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[Hashable, bytes], value: Any) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+
+class EmbeddingCache:
+    """Persistent SQLite store of embeddings keyed by sha256(model|text), kept as float16 bytes.
+
+    An optional in-process LRU (memory_size entries) sits in front of SQLite for hot keys.
+    """
+
+    def __init__(self, model: str, path: str = DEFAULT_EMBEDDING_CACHE_PATH, memory_size: int = 0) -> None:
+        self.model = model
+        self.memory_size = memory_size
+        self._mem: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._conn = _connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        # WAL lets a separate reader see committed rows while a write is in flight, so
+        # lookups never wait on the writer's commit
+        self._read_conn = _connect(path)
+        self._read_lock = threading.Lock()
+        self._mem_lock = threading.Lock()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}|{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [self._key(t) for t in texts]
+        found: Dict[bytes, bytes] = {}
+        with self._mem_lock:
+            for k in keys:
+                blob = self._mem.get(k)
+                if blob is not None:
+                    self._mem.move_to_end(k)
+                    found[k] = blob
+        missing = [k for k in keys if k not in found]
+        rows: List[Tuple[bytes, bytes]] = []
+        with self._read_lock:
+            for i in range(0, len(missing), _SQLITE_MAX_PARAMS):
+                part = missing[i:i + _SQLITE_MAX_PARAMS]
+                rows.extend(self._read_conn.execute(
+                    f"SELECT key, vec FROM cache WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+        found.update(rows)
+        self._remember(rows)
+        return [
+            np.frombuffer(found[k], dtype=np.float16).astype(np.float32).tolist() if k in found else None
+            for k in keys
+        ]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        rows = [(self._key(t), np.asarray(v, dtype=np.float16).tobytes()) for t, v in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO cache (key, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
+        self._remember(rows)
+
+    def _remember(self, rows: List[Tuple[bytes, bytes]]) -> None:
+        if self.memory_size <= 0:
+            return
+        with self._mem_lock:
+            for k, blob in rows:
+                self._mem[k] = blob
+                self._mem.move_to_end(k)
+            while len(self._mem) > self.memory_size:
+                self._mem.popitem(last=False)
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return embeddings for texts in order, calling embed_fn only for cache misses."""
+        cached = self.get_many(texts)
+        miss_idx = [i for i, v in enumerate(cached) if v is None]
+        if miss_idx:
+            miss_texts = [texts[i] for i in miss_idx]
+            fresh = embed_fn(miss_texts)
+            self.put_many(miss_texts, fresh)
+            for i, v in zip(miss_idx, fresh):
+                cached[i] = v
+        return cached  # type: ignore[return-value]
+
+    async def embed_async(
+        self, texts: List[str], embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        """Async variant of embed; lookups stay synchronous, writes (commit) run in a thread."""
+        cached = self.get_many(texts)
+        miss_idx = [i for i, v in enumerate(cached) if v is None]
+        if miss_idx:
+            miss_texts = [texts[i] for i in miss_idx]
+            fresh = await embed_fn(miss_texts)
+            await asyncio.to_thread(self.put_many, miss_texts, fresh)
+            for i, v in zip(miss_idx, fresh):
+                cached[i] = v
+        return cached  # type: ignore[return-value]
+
+
+class AnswerCache:
+    """Persistent SQLite store of generated answers, keyed by the normalized question and
+    the exact retrieved contexts so an answer is only reused for identical grounding."""
+
+    def __init__(self, path: str = DEFAULT_ANSWER_CACHE_PATH, max_rows: int = 10_000) -> None:
+        self.max_rows = max_rows
+        self._conn = _connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (key BLOB PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "created_at" not in columns:  # tables created before the size cap
+            self._conn.execute("ALTER TABLE answers ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_created_at ON answers (created_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(question: str, contexts: List[Dict[str, Any]]) -> bytes:
+        h = hashlib.blake2b(" ".join(question.lower().split()).encode("utf-8"), digest_size=16)
+        for source, text in sorted((c.get("source", ""), c.get("text", "")) for c in contexts):
+            h.update(b"\0" + source.encode("utf-8") + b"\0" + text.encode("utf-8"))
+        return h.digest()
+
+    def get(self, question: str, contexts: List[Dict[str, Any]]) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE key = ?", (self._key(question, contexts),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, question: str, contexts: List[Dict[str, Any]], answer: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, created_at) VALUES (?, ?, ?)",
+                (self._key(question, contexts), answer, time.time()),
+            )
+            # Evict oldest-first beyond max_rows
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN "
+                "(SELECT key FROM answers ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+            self._conn.commit()
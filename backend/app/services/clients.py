@@ -0,0 +1,71 @@
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models as qmodels
+
+if TYPE_CHECKING:  # pragma: no cover
+    from openai import AsyncOpenAI, OpenAI
+
+# Enough pooled connections for concurrent requests to reuse warm TLS sessions
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+# The API server multiplexes /ask traffic over HTTP/2, so it gets a larger, longer-lived pool
+ASYNC_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=40, keepalive_expiry=30)
+
+
+def _qdrant_kwargs() -> dict:
+    return {
+        "url": os.getenv("QDRANT_URL", "http://localhost:6333"),
+        "prefer_grpc": True,
+        "grpc_port": int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        "timeout": 30,
+    }
+
+
+def collection_params(size: int) -> dict:
+    """Vector, HNSW and quantization settings shared by the backend and ingestion."""
+    # Query and stored vectors are unit-length, so DOT ranks like COSINE.
+    # INT8 scalar quantization keeps a 4x smaller copy of the vectors in RAM while the
+    # full-precision vectors and the HNSW graph live on disk
+    return {
+        "vectors_config": qmodels.VectorParams(
+            size=size,
+            distance=qmodels.Distance.DOT,
+            on_disk=True,
+            datatype=qmodels.Datatype.FLOAT16,
+        ),
+        "hnsw_config": qmodels.HnswConfigDiff(m=16, ef_construct=128, on_disk=True),
+        "quantization_config": qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(
+                type=qmodels.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            ),
+        ),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_qdrant() -> QdrantClient:
+    return QdrantClient(**_qdrant_kwargs())
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant() -> AsyncQdrantClient:
+    return AsyncQdrantClient(**_qdrant_kwargs())
+
+
+@lru_cache(maxsize=1)
+def get_openai() -> "OpenAI":
+    from openai import OpenAI  # local import to avoid importing if unused
+
+    return OpenAI(http_client=httpx.Client(limits=HTTP_LIMITS))
+
+
+@lru_cache(maxsize=1)
+def get_async_openai() -> "AsyncOpenAI":
+    from openai import AsyncOpenAI  # local import to avoid importing if unused
+
+    return AsyncOpenAI(http_client=httpx.AsyncClient(http2=True, limits=ASYNC_HTTP_LIMITS))
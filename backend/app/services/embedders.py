@@ -0,0 +1,201 @@
+import os
+import asyncio
+import shutil
+import tempfile
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:  # pragma: no cover
+    SentenceTransformer = None  # type: ignore
+
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dsa-sensei", "onnx")
+
+
+def normalize_rows(vectors: Any) -> np.ndarray:
+    """L2-normalize each row so that dot product equals cosine similarity."""
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.where(norms > 0, norms, 1.0)
+
+
+def encode_length_sorted(embedder: Any, texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """Encode texts with a SentenceTransformer, batching similar lengths together.
+
+    The tokenizer pads every sequence to the longest one in its batch, so sorting by
+    length first cuts wasted padding tokens. Rows are returned in the input order.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    embs = embedder.encode(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    out = np.empty(embs.shape, dtype=np.float32)  # FP16 models return float16 rows
+    out[order] = embs
+    return out
+
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encoder backed by an INT8-quantized ONNX Runtime export.
+
+    Runs mean pooling and L2 normalization in NumPy, matching all-MiniLM-style models.
+    The exported model is cached on disk so the export only happens once. Construction
+    can take minutes on a cold cache: build it in a worker thread (RagService.warm_up)
+    or in the ingestion script, never on the event loop.
+    """
+
+    def __init__(self, model_name: str, max_length: int = 256) -> None:
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except Exception as e:  # pragma: no cover
+            raise RuntimeError("EMBEDDING_BACKEND=onnx requires optimum[onnxruntime]. Install it or unset it.") from e
+
+        self.max_length = max_length
+        model_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+        quantized_dir = os.path.join(model_dir, "int8")
+        if not os.path.exists(os.path.join(quantized_dir, "model_quantized.onnx")):
+            # Export into a private directory and publish it with one rename, so a crashed
+            # export is never mistaken for a finished one and concurrent workers do not
+            # write into the same files
+            os.makedirs(model_dir, exist_ok=True)
+            staging_dir = tempfile.mkdtemp(prefix="export-", dir=model_dir)
+            try:
+                model = ORTModelForFeatureExtraction.from_pretrained(
+                    model_name, export=True, provider="CPUExecutionProvider"
+                )
+                model.save_pretrained(os.path.join(staging_dir, "fp32"))
+                staged_int8 = os.path.join(staging_dir, "int8")
+                AutoTokenizer.from_pretrained(model_name).save_pretrained(staged_int8)
+                # Dynamic INT8 quantization; the O4 graph level is fp16/GPU-only so it is not used here
+                quantizer = ORTQuantizer.from_pretrained(os.path.join(staging_dir, "fp32"))
+                quantizer.quantize(
+                    save_dir=staged_int8,
+                    quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+                )
+                # Leftover of an interrupted export from before staging was used
+                if os.path.isdir(quantized_dir):
+                    shutil.rmtree(quantized_dir, ignore_errors=True)
+                try:
+                    os.rename(staged_int8, quantized_dir)
+                except OSError:
+                    # Another process published first; its export is equivalent
+                    if not os.path.exists(os.path.join(quantized_dir, "model_quantized.onnx")):
+                        raise
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        self.tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            quantized_dir, file_name="model_quantized.onnx", provider="CPUExecutionProvider"
+        )
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state, dtype=np.float32)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(normalize_rows(pooled) if normalize_embeddings else pooled)
+        return np.concatenate(out) if out else np.empty((0, 0), dtype=np.float32)
+
+
+def local_embedder_id(model_name: str) -> str:
+    """Identity of the local embedder for cache keys; ONNX INT8 vectors differ slightly from torch."""
+    if os.getenv("EMBEDDING_BACKEND", "torch").lower() == "onnx":
+        return f"{model_name}@onnx-int8"
+    return model_name
+
+
+def load_local_embedder(model_name: str) -> Any:
+    """Load the local embedder selected by EMBEDDING_BACKEND (torch by default, or onnx)."""
+    if os.getenv("EMBEDDING_BACKEND", "torch").lower() == "onnx":
+        return OnnxEmbedder(model_name)
+    if SentenceTransformer is None:
+        raise RuntimeError("sentence-transformers not available. Install it or set EMBEDDING_PROVIDER=openai")
+    import torch
+
+    if torch.cuda.is_available():
+        # FP16 halves memory traffic on GPU; outputs are L2-normalized float32 either way
+        return SentenceTransformer(model_name, device="cuda").half()
+    # Use every CPU this process may run on (respects affinity/cpusets in containers)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    torch.set_num_threads(cpus or 1)
+    return SentenceTransformer(model_name, device="cpu")
+
+
+class EmbedCoalescer:
+    """Merges concurrent single-text embed calls into one batched provider request.
+
+    The first queued text opens a window of window_ms; everything that arrives before
+    it closes (up to max_batch) is embedded in a single call and the results are
+    dispatched back to each caller's future.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window_ms: float = 10,
+        max_batch: int = 64,
+    ) -> None:
+        self._embed_batch = embed_batch
+        self._window_s = window_ms / 1000.0
+        self._max_batch = max_batch
+        self._queue: Optional["asyncio.Queue[Tuple[str, asyncio.Future]]"] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            # Created lazily so the queue and task belong to the running event loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        fut = loop.create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        assert self._queue is not None
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._window_s
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                vecs = await self._embed_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), vec in zip(batch, vecs):
+                if not fut.done():
+                    fut.set_result(vec)
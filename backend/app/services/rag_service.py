@@ -1,69 +1,238 @@
 import os
+import json
 import time
-import uuid
-from typing import Any, Dict, List
+import asyncio
+import mmap
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
-from openai import OpenAI
 
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:  # pragma: no cover
-    SentenceTransformer = None  # type: ignore
+from app.services.cache import (
+    DEFAULT_ANSWER_CACHE_PATH,
+    DEFAULT_EMBEDDING_CACHE_PATH,
+    AnswerCache,
+    EmbeddingCache,
+    SemanticCache,
+    SimHashCache,
+)
+from app.services.clients import collection_params, get_async_openai, get_async_qdrant
+from app.services.embedders import (
+    EmbedCoalescer,
+    encode_length_sorted,
+    load_local_embedder,
+    local_embedder_id,
+    normalize_rows,
+)
 
 load_dotenv()
 
-EMBED_DIM_OPENAI = 1536  # text-embedding-3-small
+# text-embedding-3-small truncated via Matryoshka dims; must match the ingested collection
+EMBED_DIM_OPENAI = int(os.getenv("OPENAI_EMBED_DIM", "512"))
 LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+QUERY_VEC_CACHE_SIZE = 1024
+# Collections confirmed to exist in this process -> time.monotonic() of the check.
+# Re-verified periodically in case a collection is dropped out-of-band.
+_READY: Dict[str, float] = {}
+COLLECTION_RECHECK_S = 300
+# Only these payload keys are read back from search hits
+PAYLOAD_FIELDS = qmodels.PayloadSelectorInclude(include=["text", "source"])
+# Search the INT8 copy with 2x candidates, then rescore those against the full vectors
+SEARCH_PARAMS = qmodels.SearchParams(
+    hnsw_ef=64,
+    quantization=qmodels.QuantizationSearchParams(rescore=True, oversampling=2.0),
+)
+# Max fallback documents kept mapped at once (each mapping holds a file descriptor)
+FS_MAX_OPEN = 256
+# Okapi BM25 parameters for the filesystem fallback, plus a flat bonus when a query
+# term appears in the file name (e.g. binary_search.txt for "binary search")
+BM25_K1 = 1.5
+BM25_B = 0.75
+FS_NAME_BOOST = 2.0
+_WORD_RE = re.compile(rb"\w+")
+
+# Kept byte-for-byte identical across requests (nothing per-user interpolated) so the
+# prompt prefix is eligible for OpenAI's automatic prompt caching.
+SYSTEM_PROMPT = (
+    "You are DSA-Sensei, a friendly and motivational tutor.\n"
+    "Explain this DSA concept clearly, step-by-step, with intuition and motivation.\n"
+    "Use retrieved context as factual reference.\n"
+    "Encourage the learner to stay consistent."
+)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _read_lower(pth: Path) -> bytes:
+    try:
+        return pth.read_bytes().lower()
+    except OSError:
+        return b""
 
 
 class RagService:
     def __init__(self) -> None:
-        self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-        self.client = QdrantClient(url=self.qdrant_url)
+        # Process-wide gRPC client; _ensure_collection doubles as the channel warm-up
+        # (see the startup hook in main.py).
+        self.client = get_async_qdrant()
         self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "local").lower()
-        self.openai = OpenAI()
         # Use provider-specific collection to avoid vector-size mismatches
         self.collection_name = f"dsa_docs_{self.embedding_provider}"
-        self._ensure_collection()
+        self.vector_size = EMBED_DIM_OPENAI if self.embedding_provider == "openai" else 384
         self._local_embedder = None
+        # Serializes the first load so concurrent first queries share one model
+        self._local_embedder_lock = asyncio.Lock()
+        # Persistent embedding cache shared with ingestion; empty path disables it
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH)
+        if self.embedding_provider == "openai":
+            model = f"{OPENAI_EMBED_MODEL}@{EMBED_DIM_OPENAI}"
+        else:
+            model = local_embedder_id(LOCAL_EMBED_MODEL)
+        self._embedding_cache = EmbeddingCache(model, cache_path, memory_size=10_000) if cache_path else None
+        # Answers persisted across restarts, keyed by question + retrieved contexts
+        answer_cache_path = os.getenv("ANSWER_CACHE_PATH", DEFAULT_ANSWER_CACHE_PATH)
+        answer_cache_rows = int(os.getenv("ANSWER_CACHE_MAX_ROWS", "10000"))
+        self._answer_cache: Optional[AnswerCache] = None
+        if answer_cache_path and answer_cache_rows > 0:
+            self._answer_cache = AnswerCache(answer_cache_path, max_rows=answer_cache_rows)
+        # Concurrent questions share one embeddings request; 0 ms disables coalescing
+        coalesce_ms = float(os.getenv("EMBED_COALESCE_MS", "10"))
+        self._coalescer = EmbedCoalescer(self._embed, window_ms=coalesce_ms) if coalesce_ms > 0 else None
+        # Repeat questions skip even the SQLite lookup
+        self._query_vec_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Retrieval results bucketed by a SimHash of the query vector
+        search_cache_size = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+        self._search_cache = SimHashCache(self.vector_size, capacity=search_cache_size) if search_cache_size > 0 else None
+        # Near-duplicate questions reuse a previous answer; threshold 0 disables the cache
+        threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+        capacity = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+        self._semantic_cache: Optional[SemanticCache] = None
+        if threshold > 0 and capacity > 0:
+            self._semantic_cache = SemanticCache(self.vector_size, capacity=capacity, threshold=threshold)
+        # Filesystem fallback: the document list is fixed at startup; mappings open lazily
+        # backend/app/services -> repo_root/data, unless DATA_DIR points elsewhere
+        self._data_dir = os.path.abspath(
+            os.getenv("DATA_DIR") or os.path.join(os.path.dirname(__file__), "../../../data")
+        )
+        data_path = Path(self._data_dir)
+        self._fs_paths: List[Path] = (
+            [p for p in data_path.rglob("*") if p.suffix in {".txt", ".md"} and p.is_file()]
+            if data_path.is_dir()
+            else []
+        )
+        # path -> mapped file, least recently used first
+        self._fs_index: "OrderedDict[Path, Any]" = OrderedDict()
+        # path -> lowercased bytes; computed once and kept even when the mapping is evicted
+        self._fs_lower: Dict[Path, bytes] = {}
+        # Inverted index over _fs_paths, built on the first fallback query
+        # term -> (doc ids ascending, term frequencies, first byte offset in each doc)
+        self._fs_postings: Optional[Dict[bytes, Tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+        self._fs_name_postings: Dict[bytes, np.ndarray] = {}
+        self._fs_doc_len = np.zeros(0, dtype=np.float32)
+        self._fs_avgdl = 0.0
+        # _fs_search runs in worker threads; evicting a mapping must not race a reader
+        self._fs_lock = threading.Lock()
+
+    @cached_property
+    def openai(self) -> Any:
+        # Built on first use: local-embedding deployments without OPENAI_API_KEY never
+        # construct it, and a missing key surfaces inside _answer's offline fallback
+        return get_async_openai()
 
-    def _ensure_collection(self) -> None:
+    async def warm_up(self) -> None:
+        # Pay the local model load at startup rather than on the first question
+        if self.embedding_provider != "openai":
+            await self._get_local_embedder()
+        await self._ensure_collection()
+
+    async def _ensure_collection(self) -> None:
+        checked_at = _READY.get(self.collection_name)
+        if checked_at is not None and time.monotonic() - checked_at < COLLECTION_RECHECK_S:
+            return
         # Create if missing, do not drop existing collection
         try:
-            if not self.client.collection_exists(collection_name=self.collection_name):
-                # Choose vector size based on provider
-                size = EMBED_DIM_OPENAI if self.embedding_provider == "openai" else 384
-                self.client.create_collection(
+            if not await self.client.collection_exists(collection_name=self.collection_name):
+                await self.client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE),
+                    **collection_params(self.vector_size),
                 )
         except Exception as e:
             raise RuntimeError(f"Failed ensuring collection '{self.collection_name}': {e}")
+        _READY[self.collection_name] = time.monotonic()
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self._embedding_cache is not None:
+            return await self._embedding_cache.embed_async(texts, self._embed_uncached)
+        return await self._embed_uncached(texts)
+
+    async def _embed_query(self, query: str) -> List[float]:
+        # Case and spacing do not change what is being asked; embedding the normalized
+        # form keeps the vector consistent for every variant that shares the key
+        key = " ".join(query.lower().split())
+        vec = self._query_vec_cache.get(key)
+        if vec is not None:
+            self._query_vec_cache.move_to_end(key)
+            return vec
+        if self._coalescer is not None:
+            vec = await self._coalescer.embed(key)
+        else:
+            vec = (await self._embed([key]))[0]
+        self._query_vec_cache[key] = vec
+        if len(self._query_vec_cache) > QUERY_VEC_CACHE_SIZE:
+            self._query_vec_cache.popitem(last=False)
+        return vec
 
-    def _embed(self, texts: List[str]) -> List[List[float]]:
+    async def _get_local_embedder(self) -> Any:
+        if self._local_embedder is None:
+            async with self._local_embedder_lock:
+                if self._local_embedder is None:
+                    # Model load (and a possible first-time download) must not block the loop
+                    self._local_embedder = await asyncio.to_thread(load_local_embedder, LOCAL_EMBED_MODEL)
+        return self._local_embedder
+
+    async def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
         if self.embedding_provider == "openai":
-            response = self.openai.embeddings.create(model="text-embedding-3-small", input=texts)
-            return [d.embedding for d in response.data]
+            response = await self.openai.embeddings.create(
+                model=OPENAI_EMBED_MODEL, input=texts, dimensions=EMBED_DIM_OPENAI
+            )
+            # Normalized so DOT distance on the collection matches cosine similarity
+            return list(normalize_rows([d.embedding for d in response.data]))
         # local embeddings
-        if self._local_embedder is None:
-            if SentenceTransformer is None:
-                raise RuntimeError("sentence-transformers not available. Install it or set EMBEDDING_PROVIDER=openai")
-            self._local_embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
-        embs = self._local_embedder.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
-        return [e.tolist() for e in embs]
-
-    def _search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        query_vec = self._embed([query])[0]
-        res = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=query_vec,
-            limit=k,
-            with_payload=True,
-        )
-        docs: List[Dict[str, Any]] = []
+        embedder = await self._get_local_embedder()
+        # Encoding is CPU-bound; keep it off the event loop
+        embs = await asyncio.to_thread(encode_length_sorted, embedder, texts)
+        # Rows stay float32 arrays; the Qdrant client and the caches accept them as-is
+        return list(embs)
+
+    async def _search(self, query: str, k: int = 3, query_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        if query_vec is None:
+            query_vec = await self._embed_query(query)
+        cache_key = (k, self._search_cache.signature(query_vec)) if self._search_cache else None
+        docs = self._search_cache.get(cache_key) if cache_key else None
+        if docs:
+            return docs
+        await self._ensure_collection()
+        res = (
+            await self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vec,
+                limit=k,
+                search_params=SEARCH_PARAMS,
+                with_payload=PAYLOAD_FIELDS,
+                with_vectors=False,
+            )
+        ).points
+        docs = []
         for p in res:
             payload = p.payload or {}
             docs.append({
@@ -73,122 +242,222 @@ class RagService:
             })
         # Filesystem fallback if nothing retrieved (e.g., empty collection)
         if docs:
+            # Only vector hits are cached, so an empty collection is re-checked after ingestion
+            if cache_key:
+                self._search_cache.put(cache_key, docs)
             return docs
+        # Filesystem scan is blocking I/O; run it in a worker thread
+        return await asyncio.to_thread(self._fs_search, query, k)
 
-        try:
-            # backend/app/services -> repo_root/data
-            data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../data"))
-            paths = []
-            for root, _, files in os.walk(data_dir):
-                for fn in files:
-                    if fn.endswith((".txt", ".md")):
-                        paths.append(os.path.join(root, fn))
-            query_lower = query.lower()
-            tokens = [t for t in query_lower.replace("\n", " ").split() if t]
-            candidates: List[Dict[str, Any]] = []
+    def _fs_doc(self, pth: Path) -> Tuple[Any, bytes]:
+        buf = self._fs_index.get(pth)
+        if buf is not None:
+            self._fs_index.move_to_end(pth)
+        else:
+            try:
+                fd = os.open(pth, os.O_RDONLY)
+            except OSError:
+                # Deleted since startup; treat as empty rather than failing every query
+                fd = -1
+            try:
+                # mmap cannot map an empty file
+                buf = mmap.mmap(fd, 0, access=mmap.ACCESS_READ) if fd >= 0 and os.fstat(fd).st_size else b""
+            finally:
+                if fd >= 0:
+                    os.close(fd)
+            self._fs_index[pth] = buf
+            while len(self._fs_index) > FS_MAX_OPEN:
+                _, old = self._fs_index.popitem(last=False)
+                if isinstance(old, mmap.mmap):
+                    old.close()
+        lower = self._fs_lower.get(pth)
+        if lower is None:
+            lower = self._fs_lower[pth] = buf[:].lower()
+        return buf, lower
 
-            # Prioritize filename matches
-            def score_path(pth: str, content_lc: str) -> int:
-                name = os.path.basename(pth).lower()
-                score = 0
-                for t in tokens:
-                    if t in name:
-                        score += 2
-                    if t in content_lc:
-                        score += 1
-                return score
-
-            scored: List[tuple[int, str]] = []
-            cache_content: Dict[str, str] = {}
-            for pth in paths:
-                with open(pth, "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read()
-                content_lc = content.lower()
-                cache_content[pth] = content
-                s = score_path(pth, content_lc)
-                if s > 0:
-                    scored.append((s, pth))
-
-            # If nothing scored, still return first file snippet as a fallback
-            if not scored and paths:
-                pth = paths[0]
-                content = cache_content.get(pth)
-                if content is None:
-                    with open(pth, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                snippet = content[:800]
-                return [{"text": snippet, "source": os.path.relpath(pth, data_dir), "score": 0.0}]
-
-            scored.sort(reverse=True)
-            for _, pth in scored[:k]:
-                content = cache_content[pth]
-                content_lc = content.lower()
-                # pick first token occurrence among tokens
-                idxs = [content_lc.find(t) for t in tokens if content_lc.find(t) != -1]
-                anchor = min(idxs) if idxs else 0
-                start = max(0, anchor - 300)
-                end = min(len(content), start + 800)
-                snippet = content[start:end]
-                candidates.append({"text": snippet, "source": os.path.relpath(pth, data_dir), "score": 0.0})
-            return candidates
+    def _fs_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        try:
+            with self._fs_lock:
+                return self._fs_search_locked(query, k)
         except Exception:
             return []
 
+    def _build_fs_index(self) -> None:
+        # Only the lowercased text is needed here; mappings are opened lazily for snippets
+        missing = [pth for pth in self._fs_paths if pth not in self._fs_lower]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for pth, lower in zip(missing, pool.map(_read_lower, missing)):
+                self._fs_lower[pth] = lower
+        postings: Dict[bytes, Dict[int, Tuple[int, int]]] = {}
+        name_postings: Dict[bytes, List[int]] = {}
+        doc_len = np.zeros(len(self._fs_paths), dtype=np.float32)
+        for doc_id, pth in enumerate(self._fs_paths):
+            terms: Counter = Counter()
+            first: Dict[bytes, int] = {}
+            for m in _WORD_RE.finditer(self._fs_lower[pth]):
+                term = m.group()
+                terms[term] += 1
+                first.setdefault(term, m.start())
+            doc_len[doc_id] = sum(terms.values())
+            for term, tf in terms.items():
+                postings.setdefault(term, {})[doc_id] = (tf, first[term])
+            for term in set(_WORD_RE.findall(pth.stem.lower().replace("_", " ").encode("utf-8"))):
+                name_postings.setdefault(term, []).append(doc_id)
+        self._fs_postings = {
+            term: (
+                np.fromiter(d.keys(), np.int64, len(d)),
+                np.fromiter((tf for tf, _ in d.values()), np.float32, len(d)),
+                np.fromiter((pos for _, pos in d.values()), np.int64, len(d)),
+            )
+            for term, d in postings.items()
+        }
+        self._fs_name_postings = {term: np.asarray(ids, dtype=np.int64) for term, ids in name_postings.items()}
+        self._fs_doc_len = doc_len
+        self._fs_avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    def _fs_search_locked(self, query: str, k: int) -> List[Dict[str, Any]]:
+        data_dir = self._data_dir
+        paths = self._fs_paths
+        if not paths:
+            return []
+        if self._fs_postings is None:
+            self._build_fs_index()
+        postings = self._fs_postings or {}
+        tokens = list(dict.fromkeys(_WORD_RE.findall(query.lower().encode("utf-8"))))
+
+        n_docs = len(paths)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for t in tokens:
+            if t in postings:
+                docs, tf, _ = postings[t]
+                idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._fs_doc_len[docs] / self._fs_avgdl)
+                scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+            # Prioritize filename matches
+            if t in self._fs_name_postings:
+                scores[self._fs_name_postings[t]] += FS_NAME_BOOST
+
+        hits = np.flatnonzero(scores > 0)
+        # If nothing scored, still return first file snippet as a fallback
+        if not hits.size:
+            first = next((p for p in paths if self._fs_lower.get(p)), None)
+            if first is None:
+                return []
+            content, _ = self._fs_doc(first)
+            snippet = str(content[:800], "utf-8", "ignore")
+            return [{"text": snippet, "source": os.path.relpath(first, data_dir), "score": 0.0}]
+
+        # Partial partition picks the top k in O(n); only those k are then sorted
+        if 0 < k < hits.size:
+            hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+        candidates: List[Dict[str, Any]] = []
+        for i in hits[np.argsort(-scores[hits], kind="stable")][:k]:
+            pth = paths[i]
+            content, _ = self._fs_doc(pth)
+            # Anchor on the earliest query term, using offsets recorded at index time
+            offsets = []
+            for t in tokens:
+                if t in postings:
+                    docs, _, first = postings[t]
+                    j = int(np.searchsorted(docs, i))
+                    if j < len(docs) and docs[j] == i:
+                        offsets.append(int(first[j]))
+            anchor = min(offsets) if offsets else 0
+            start = max(0, anchor - 300)
+            end = min(len(content), start + 800)
+            snippet = str(content[start:end], "utf-8", "ignore")
+            candidates.append({"text": snippet, "source": os.path.relpath(pth, data_dir), "score": float(scores[i])})
+        return candidates
+
     def _compose_prompt(self, question: str, contexts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        ctx_block = "\n\n".join([f"[Source: {c['source']}]\n{c['text']}" for c in contexts]) if contexts else ""
-        system = (
-            "You are DSA-Sensei, a friendly and motivational tutor.\n"
-            "Explain this DSA concept clearly, step-by-step, with intuition and motivation.\n"
-            "Use retrieved context as factual reference.\n"
-            "Encourage the learner to stay consistent."
-        )
-        user = (
-            f"Question: {question}\n\n"
-            f"Retrieved context (may be partial, use prudently):\n{ctx_block}"
-        )
+        # Context comes before the question, in a deterministic order, so identical
+        # retrievals share a byte-identical prefix for OpenAI prompt caching
+        ordered = sorted(contexts, key=lambda c: (c.get("source", ""), c.get("text", "")))
+        user = "".join([
+            "Retrieved context (may be partial, use prudently):\n",
+            "\n\n".join([f"[Source: {c['source']}]\n{c['text']}" for c in ordered]),
+            "\n\nQuestion: ",
+            question,
+        ])
         return [
-            {"role": "system", "content": system},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user},
         ]
 
-    def _answer(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    async def _answer(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         # Try OpenAI if available and quota allows; otherwise fallback to a deterministic tutor response
+        start = time.time()
         try:
-            start = time.time()
-            resp = self.openai.chat.completions.create(
+            resp = await self.openai.chat.completions.create(
                 model="gpt-4o",
                 messages=messages,
                 temperature=0.3,
             )
-            latency_ms = int((time.time() - start) * 1000)
-            usage = getattr(resp, "usage", None)
-            return {
-                "answer": resp.choices[0].message.content,
-                "token_usage": dict(usage) if usage else {},
-                "generation_latency_ms": latency_ms,
-            }
-        except Exception as e:
-            # Fallback local response
-            user_msg = next((m for m in messages if m["role"] == "user"), {"content": ""})["content"]
-            answer = (
-                "DSA-Sensei (offline mode):\n"
-                "- I will still guide you step-by-step using retrieved notes.\n\n"
-                "Step 1: Understand the question.\n"
-                f"- {user_msg}\n\n"
-                "Step 2: Key ideas you may need:\n"
-                "- Patterns like Two Pointers, Sliding Window, Hashing, Sorting.\n"
-                "- Mind the constraints and edge cases.\n\n"
-                "Step 3: From context (if any), relevant snippets are provided above.\n\n"
-                "Step 4: Outline a solution\n"
-                "- Write down approach, then complexity O(n) / O(n log n) where applicable.\n\n"
-                "Stay consistent — small daily practice builds mastery."
-            )
-            return {"answer": answer, "token_usage": {}, "generation_latency_ms": 0}
+        except Exception:
+            return {"answer": self._offline_answer(messages), "token_usage": {}, "generation_latency_ms": 0, "offline": True}
+        latency_ms = int((time.time() - start) * 1000)
+        usage = getattr(resp, "usage", None)
+        return {
+            "answer": resp.choices[0].message.content,
+            "token_usage": usage.model_dump() if usage is not None else {},
+            "generation_latency_ms": latency_ms,
+        }
+
+    def _offline_answer(self, messages: List[Dict[str, str]]) -> str:
+        # Fallback local response
+        user_msg = next((m for m in messages if m["role"] == "user"), {"content": ""})["content"]
+        return (
+            "DSA-Sensei (offline mode):\n"
+            "- I will still guide you step-by-step using retrieved notes.\n\n"
+            "Step 1: Understand the question.\n"
+            f"- {user_msg}\n\n"
+            "Step 2: Key ideas you may need:\n"
+            "- Patterns like Two Pointers, Sliding Window, Hashing, Sorting.\n"
+            "- Mind the constraints and edge cases.\n\n"
+            "Step 3: From context (if any), relevant snippets are provided above.\n\n"
+            "Step 4: Outline a solution\n"
+            "- Write down approach, then complexity O(n) / O(n log n) where applicable.\n\n"
+            "Stay consistent — small daily practice builds mastery."
+        )
 
-    def answer_question(self, user_id: str, question: str, k: int = 3) -> Dict[str, Any]:
-        contexts = self._search(question, k=k)
-        messages = self._compose_prompt(question, contexts)
-        gen = self._answer(messages)
+    async def _answer_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        stream = await self.openai.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            temperature=0.3,
+            stream=True,
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    async def _lookup_cached(self, question: str, k: int) -> Tuple[List[float], Optional[Dict[str, Any]]]:
+        query_vec = await self._embed_query(question)
+        cached = self._semantic_cache.get(query_vec) if self._semantic_cache else None
+        if cached is not None and cached["k"] != k:
+            cached = None
+        return query_vec, cached
+
+    async def answer_question(self, user_id: str, question: str, k: int = 3) -> Dict[str, Any]:
+        query_vec, cached = await self._lookup_cached(question, k)
+        if cached is not None:
+            contexts = cached["contexts"]
+            gen = {"answer": cached["answer"], "token_usage": {}, "generation_latency_ms": 0}
+        else:
+            contexts = await self._search(question, k=k, query_vec=query_vec)
+            answer = self._answer_cache.get(question, contexts) if self._answer_cache else None
+            if answer is not None:
+                gen = {"answer": answer, "token_usage": {}, "generation_latency_ms": 0}
+            else:
+                messages = self._compose_prompt(question, contexts)
+                gen = await self._answer(messages)
+                if self._answer_cache and not gen.get("offline"):
+                    # SQLite commit happens in a worker thread, not on the event loop
+                    await asyncio.to_thread(self._answer_cache.put, question, contexts, gen["answer"])
+            # Offline answers echo the question back, so they must not be served to other queries
+            if self._semantic_cache and not gen.get("offline"):
+                self._semantic_cache.put(query_vec, {"k": k, "contexts": contexts, "answer": gen["answer"]})
         return {
             "user_id": user_id,
             "question": question,
@@ -197,5 +466,48 @@ class RagService:
             "metrics": {
                 "token_usage": gen.get("token_usage", {}),
                 "generation_latency_ms": gen.get("generation_latency_ms", 0),
+                "cache_hit": cached is not None,
             },
         }
+
+    async def stream_answer(self, user_id: str, question: str, k: int = 3) -> AsyncIterator[str]:
+        """Yield server-sent events: retrieved contexts first, then answer deltas as they arrive."""
+        # The 200 response has already started by the time this runs, so retrieval
+        # failures are reported in-band instead of as an HTTP error like /ask
+        try:
+            query_vec, cached = await self._lookup_cached(question, k)
+            answer: Optional[str] = None
+            if cached is not None:
+                contexts = cached["contexts"]
+                answer = cached["answer"]
+            else:
+                contexts = await self._search(question, k=k, query_vec=query_vec)
+                answer = self._answer_cache.get(question, contexts) if self._answer_cache else None
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            yield _sse("done", {"cache_hit": False})
+            return
+        yield _sse("contexts", {"user_id": user_id, "question": question, "contexts": contexts})
+        if answer is not None:
+            yield _sse("delta", {"text": answer})
+        else:
+            messages = self._compose_prompt(question, contexts)
+            parts: List[str] = []
+            try:
+                async for delta in self._answer_stream(messages):
+                    parts.append(delta)
+                    yield _sse("delta", {"text": delta})
+            except Exception as e:
+                if parts:
+                    yield _sse("error", {"detail": str(e)})
+                    yield _sse("done", {"cache_hit": False})
+                    return
+                yield _sse("delta", {"text": self._offline_answer(messages)})
+            if parts:
+                # The stream completed; cache the accumulated text like a non-streamed answer
+                answer = "".join(parts)
+                if self._answer_cache:
+                    await asyncio.to_thread(self._answer_cache.put, question, contexts, answer)
+                if self._semantic_cache:
+                    self._semantic_cache.put(query_vec, {"k": k, "contexts": contexts, "answer": answer})
+        yield _sse("done", {"cache_hit": cached is not None})
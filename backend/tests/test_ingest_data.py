@@ -0,0 +1,42 @@
+import pytest
+
+from app.db.ingest_data import chunk_text
+
+SIZE = 10
+OVERLAP = 3
+STEP = SIZE - OVERLAP
+
+
+def _reassemble(chunks, overlap):
+    if not chunks:
+        return ""
+    return chunks[0] + "".join(c[overlap:] for c in chunks[1:])
+
+
+@pytest.mark.parametrize(
+    "length",
+    [0, 1, OVERLAP, SIZE, SIZE + 1]
+    + [k * STEP + d for k in (1, 2, 3) for d in (-1, 0, 1)],
+)
+def test_chunk_text_boundaries(length):
+    text = "".join(chr(ord("a") + i % 26) for i in range(length))
+    chunks = chunk_text(text, size=SIZE, overlap=OVERLAP)
+
+    assert all(0 < len(c) <= SIZE for c in chunks)
+    assert _reassemble(chunks, OVERLAP) == text
+    # No trailing window that only repeats the previous chunk's overlap
+    assert all(len(c) > OVERLAP for c in chunks[1:])
+
+
+def test_chunk_text_defaults():
+    text = "x" * 1234
+    chunks = chunk_text(text)
+
+    assert all(len(c) <= 500 for c in chunks)
+    assert _reassemble(chunks, 50) == text
+
+
+@pytest.mark.parametrize("overlap", [SIZE, SIZE + 1])
+def test_chunk_text_rejects_overlap_not_smaller_than_size(overlap):
+    with pytest.raises(ValueError):
+        chunk_text("abc", size=SIZE, overlap=overlap)